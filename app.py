@@ -1,7 +1,12 @@
-from flask import Flask, request, jsonify, render_template, session, g
+from flask import Flask, request, jsonify, render_template, session, abort
 import sqlite3
 import os
-from random import randint
+import re
+import threading
+from functools import lru_cache
+import time
+import uuid
+from random import sample
 
 # Create an instance of the Flask class
 app = Flask(__name__)
@@ -14,6 +19,34 @@ app.config.update(dict(
 ))
 app.config.from_envvar('FLASKR_SETTINGS',
                        silent=True)  # Load additional configuration from a specified environment variable, if set
+app.json.compact = True  # Serialize JSON responses without pretty-printing, even in debug mode
+
+# Per-thread storage for long-lived database connections
+_local = threading.local()
+
+# How long (in seconds) a fetched high score list is served before re-querying
+HIGH_SCORES_TTL = 5
+
+# Cached high score lists, keyed by limit: {limit: (fetched_at, scores)}
+_high_scores_cache = {}
+
+# Bumped by every score insert so a query that raced an insert is not cached
+_high_scores_generation = 0
+
+# Guards the generation check and the cache write against a concurrent insert
+_high_scores_lock = threading.Lock()
+
+# Largest number of scores accepted by a single POST to /add_score
+MAX_SCORES_PER_REQUEST = 100
+
+# Range of scores that fit in an SQLite INTEGER (signed 64-bit)
+MIN_SCORE, MAX_SCORE = -2 ** 63, 2 ** 63 - 1
+
+# Whole number scores posted as text, e.g. by the Hi-Lo game over form
+SCORE_PATTERN = re.compile(r'-?[0-9]+')
+
+# How long (in seconds) an untouched Hi-Lo game is kept before it is pruned
+GAME_STATE_MAX_AGE = 24 * 60 * 60
 
 
 # Function to connect to the database
@@ -21,13 +54,18 @@ def connect_db():
     """Connects to the specific database.
 
     This function creates a connection to the SQLite database specified in the app configuration.
-    It sets the row factory to sqlite3.Row to access columns by name.
+    Rows are returned as plain tuples, which are cheaper to build and index than sqlite3.Row.
+    It applies the per-connection pragmas (the WAL journal mode itself is persistent and set in init_db).
 
     Returns:
         sqlite3.Connection: A connection object to interact with the database.
     """
     rv = sqlite3.connect(app.config['DATABASE'])
-    rv.row_factory = sqlite3.Row  # Allows accessing columns by name
+    rv.execute('PRAGMA synchronous=NORMAL')  # One fsync per checkpoint instead of per commit (safe under WAL)
+    rv.execute('PRAGMA busy_timeout=30000')  # Wait up to 30s for a lock instead of failing immediately
+    rv.execute('PRAGMA temp_store=MEMORY')  # Keep temporary tables and indices in memory
+    rv.execute('PRAGMA cache_size=-20000')  # Use a ~20MB page cache
+    rv.execute('PRAGMA mmap_size=268435456')  # Read pages through a 256MB memory map instead of read() calls
     return rv
 
 
@@ -37,11 +75,19 @@ def init_db():
 
     This function initializes the database by executing the schema script located in 'schema.sql'.
     It sets up the necessary tables and their structure in the database.
+    It uses its own short-lived connection rather than get_db(), so no connection opened at
+    import time survives into worker processes forked from this one.
     """
-    db = get_db()  # Get a database connection
-    with app.open_resource('schema.sql', mode='r') as f:  # Open the schema script
-        db.cursor().executescript(f.read())  # Execute the script to create tables
-    db.commit()  # Commit the changes
+    db = connect_db()  # Open a dedicated connection
+    try:
+        db.execute('PRAGMA journal_mode=WAL')  # Persistent: readers no longer block the writer
+        with app.open_resource('schema.sql', mode='r') as f:  # Open the schema script
+            db.cursor().executescript(f.read())  # Execute the script to create tables
+        db.commit()  # Commit the changes
+        prune_game_state(db)  # Drop games abandoned while the app was down
+        db.execute('PRAGMA optimize')  # Refresh query planner statistics if needed
+    finally:
+        db.close()  # Close the connection
 
 
 # Command to initialize the database from the command line
@@ -58,32 +104,54 @@ def initdb_command():
 
 # Function to get a database connection
 def get_db():
-    """Opens a new database connection if there is none yet for the current application context.
+    """Returns the database connection for the current thread, opening it on first use.
 
-    This function checks if a database connection already exists for the current application context.
-    If not, it establishes a new connection and stores it in the application context.
+    Each worker thread keeps one long-lived connection that is reused across requests,
+    so the file open, pragma setup and page cache warm-up happen once per thread
+    instead of once per request. This only pays off under a server with a persistent
+    thread pool (e.g. gunicorn's gthread worker). The development server started by
+    app.run() uses a new thread per request, so there the connection is opened per
+    request and closed when the thread's storage is garbage collected.
 
     Returns:
         sqlite3.Connection: A connection object to interact with the database.
     """
-    if not hasattr(g, 'sqlite_db'):
-        g.sqlite_db = connect_db()  # Establish a new database connection
-    return g.sqlite_db  # Return the connection
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = connect_db()  # Establish a new connection for this thread
+    return conn  # Return the connection
 
 
-# Function to close the database connection
+# Function to reset the database connection after a request
 @app.teardown_appcontext
 def close_db(error):
-    """Closes the database again at the end of the request.
+    """Rolls back any uncommitted work at the end of the request.
 
-    This function closes the database connection at the end of the request.
-    It ensures that the connection is properly closed to avoid resource leaks.
+    The connection itself stays open for reuse by the next request on this thread;
+    rolling back ensures a failed request cannot leave a transaction open on it.
 
     Args:
         error (Optional[Exception]): An optional error that may have occurred during the request.
     """
-    if hasattr(g, 'sqlite_db'):
-        g.sqlite_db.close()  # Close the database connection if it exists
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.rollback()  # Discard any uncommitted changes
+
+
+# Function to add several scores to the database
+def add_scores(scores):
+    """Inserts many scores into the database in a single transaction.
+
+    Args:
+        scores (Iterable[tuple]): (name, score) pairs to insert.
+    """
+    global _high_scores_generation
+    conn = get_db()  # Reuse the connection for the current thread
+    conn.executemany('INSERT INTO high_scores (name, score) VALUES (?, ?)', scores)  # Insert all scores at once
+    conn.commit()  # Commit the transaction
+    with _high_scores_lock:
+        _high_scores_generation += 1  # Stop in-flight queries from caching pre-insert results
+        _high_scores_cache.clear()  # Invalidate cached high scores
 
 
 # Function to add a score to the database
@@ -94,32 +162,145 @@ def add_score(name, score):
         name (str): The name of the player.
         score (int): The score of the player.
     """
-    conn = get_db()  # Get a database connection
-    conn.execute('INSERT INTO scores (name, score) VALUES (?, ?)', (name, score))  # Insert the score into the database
-    conn.commit()  # Commit the transaction
-    conn.close()  # Close the connection
+    add_scores([(name, score)])  # Insert the single score
+
+
+# Function to validate a posted score
+def parse_score(value):
+    """Converts a posted score to an int, rejecting anything but a whole number.
+
+    Args:
+        value: The score from the request, either an int or a string of digits.
+
+    Returns:
+        int: The score.
+
+    Raises:
+        ValueError: If the score is not a whole number that fits in an SQLite INTEGER.
+    """
+    if isinstance(value, str) and SCORE_PATTERN.fullmatch(value):
+        value = int(value)  # Accept numeric strings from forms
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f'Not a whole number: {value!r}')
+    if not MIN_SCORE <= value <= MAX_SCORE:
+        raise ValueError(f'Score out of range: {value}')
+    return value
 
 
 # Function to retrieve high scores from the database
 def get_high_scores(limit=10):
     """Retrieves high scores from the database.
 
+    Results are cached for HIGH_SCORES_TTL seconds; add_scores() invalidates the cache.
+    A result is only cached if no score was inserted while it was being fetched, so a
+    new score shows up immediately in this process. Other worker processes keep their
+    own caches and may serve scores up to HIGH_SCORES_TTL seconds stale.
+
     Args:
         limit (int, optional): The number of top scores to retrieve. Defaults to 10.
 
     Returns:
         list: A list of tuples containing the name and score of the top players.
     """
-    conn = get_db()  # Get a database connection
-    scores = conn.execute('SELECT name, score FROM scores ORDER BY score DESC LIMIT ?',
+    cached = _high_scores_cache.get(limit)
+    if cached is not None and time.time() - cached[0] < HIGH_SCORES_TTL:
+        return cached[1]  # Serve the cached scores while they are fresh
+
+    generation = _high_scores_generation  # Note the generation before querying
+    conn = get_db()  # Reuse the connection for the current thread
+    scores = conn.execute('SELECT name, score FROM high_scores ORDER BY score DESC LIMIT ?',
                           (limit,)).fetchall()  # Retrieve the top scores
-    conn.close()  # Close the connection
+    with _high_scores_lock:
+        if generation == _high_scores_generation:
+            _high_scores_cache[limit] = (time.time(), scores)  # Cache the scores unless an insert raced the query
     return scores  # Return the scores
 
 
-# Manually push the application context to initialize the database
+# Function to get the game id for the current player
+def get_game_id():
+    """Returns the id that keys the current player's game state, creating it on first visit.
+
+    The session cookie only holds this id, so it is signed once and left untouched by later guesses.
+
+    Returns:
+        str: The player's game id.
+    """
+    if 'game_id' not in session:
+        session['game_id'] = uuid.uuid4().hex  # Assign a new random id
+    return session['game_id']
+
+
+# Function to retrieve the Hi-Lo game state from the database
+def get_hilo_state(game_id):
+    """Retrieves the Hi-Lo points and errors for a game, starting a new game if none exists.
+
+    Args:
+        game_id (str): The player's game id.
+
+    Returns:
+        tuple: The (points, errors) of the game.
+    """
+    conn = get_db()  # Reuse the connection for the current thread
+    query = 'SELECT hilo_points, hilo_errors FROM game_state WHERE session_id = ?'
+    state = conn.execute(query, (game_id,)).fetchone()  # Look up the game by primary key
+    if state is None:
+        prune_game_state(conn)  # New games are what grow the table, so clear out stale ones first
+        conn.execute('INSERT OR IGNORE INTO game_state (session_id) VALUES (?)',
+                     (game_id,))  # Start with default values unless a concurrent request already did
+        conn.commit()  # Commit the transaction
+        state = conn.execute(query, (game_id,)).fetchone()  # Read back whichever row won
+    return state
+
+
+# Function to update the Hi-Lo game state in the database
+def update_hilo_state(game_id, points_change, errors_change):
+    """Applies a change to the Hi-Lo points and errors of a game in a single UPDATE.
+
+    A game with no row yet (a new cookie, a direct POST or a wiped database) is created
+    with the default values first, so the change is never lost.
+
+    Args:
+        game_id (str): The player's game id.
+        points_change (int): The amount to add to the points.
+        errors_change (int): The amount to add to the errors.
+    """
+    conn = get_db()  # Reuse the connection for the current thread
+    conn.execute('INSERT OR IGNORE INTO game_state (session_id) VALUES (?)', (game_id,))  # Ensure the row exists
+    conn.execute('UPDATE game_state SET hilo_points = hilo_points + ?, hilo_errors = hilo_errors + ?, '
+                 "updated_at = CAST(strftime('%s', 'now') AS INTEGER) WHERE session_id = ?",
+                 (points_change, errors_change, game_id))  # Do the arithmetic in SQL
+    conn.commit()  # Commit the transaction
+
+
+# Function to delete the Hi-Lo game state from the database
+def delete_hilo_state(game_id):
+    """Deletes a finished game; the next visit starts a new one with the default values.
+
+    Args:
+        game_id (str): The player's game id.
+    """
+    conn = get_db()  # Reuse the connection for the current thread
+    conn.execute('DELETE FROM game_state WHERE session_id = ?', (game_id,))  # Remove the finished game
+    conn.commit()  # Commit the transaction
+
+
+# Function to prune abandoned Hi-Lo games from the database
+def prune_game_state(conn):
+    """Deletes games that have not been updated for GAME_STATE_MAX_AGE seconds.
+
+    Args:
+        conn (sqlite3.Connection): The connection to prune through.
+    """
+    conn.execute("DELETE FROM game_state WHERE updated_at < CAST(strftime('%s', 'now') AS INTEGER) - ?",
+                 (GAME_STATE_MAX_AGE,))  # Remove stale games
+    conn.commit()  # Commit the transaction
+
+
+# Manually push the application context to initialize the database and compile the templates
 with app.app_context():
     init_db()
+    for template_name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template_name)  # Load and compile each template into the cache
 
 
 # Route to add a score
@@ -127,14 +308,25 @@ with app.app_context():
 def add_score_route():
     """Handles the POST request to add a score.
 
-    This route receives JSON data containing the name and score of a player,
-    adds the score to the database, and returns a success message.
+    This route receives JSON data containing the name and score of a player, or a non-empty
+    list of up to MAX_SCORES_PER_REQUEST such objects, adds the scores to the database,
+    and returns a success message.
 
     Returns:
-        Response: A JSON response indicating success.
+        Response: A JSON response indicating success, or a 400 error for malformed data.
     """
-    score_data = request.json  # Get the JSON data from the request
-    add_score(score_data['name'], score_data['score'])  # Add the score to the database
+    score_data = request.get_json(silent=True)  # Parse the JSON body once
+    items = score_data if isinstance(score_data, list) else [score_data]
+    if not items or len(items) > MAX_SCORES_PER_REQUEST:
+        return jsonify({'message': f'Expected between 1 and {MAX_SCORES_PER_REQUEST} scores.'}), 400
+    try:
+        scores = [(item['name'], parse_score(item['score'])) for item in items]  # Validate every score
+    except (KeyError, TypeError, ValueError, OverflowError):
+        scores = None
+    if scores is None or not all(isinstance(name, str) for name, _ in scores):
+        return jsonify({'message': 'Each score needs a text name and a whole number score.'}), 400
+
+    add_scores(scores)  # Add all scores in one transaction
     return jsonify({'message': 'Score added successfully!'}), 201  # Return a success message
 
 
@@ -149,7 +341,42 @@ def get_high_scores_route():
         Response: A JSON response containing the top scores.
     """
     scores = get_high_scores()  # Retrieve the top scores from the database
-    return jsonify([{'name': row['name'], 'score': row['score']} for row in scores])  # Return the scores as JSON
+    return jsonify([{'name': name, 'score': score} for name, score in scores])  # Return the scores as JSON
+
+
+# Function to render a template that takes no context
+def render_static(template_name):
+    """Renders a context-free template once and returns the cached HTML afterwards.
+
+    Rendering happens on the first request rather than at import time because the
+    templates use url_for, which needs a request context. The cache is keyed on the
+    script root so url_for output matches the mount point, and it is bypassed while
+    template auto-reloading is on (e.g. in debug mode) so template edits show up.
+
+    Args:
+        template_name (str): The name of the template to render.
+
+    Returns:
+        str: The rendered HTML.
+    """
+    if app.jinja_env.auto_reload:
+        return render_template(template_name)  # Render fresh so template edits are picked up
+    return _render_static_cached(template_name, request.script_root)
+
+
+# Function to cache the rendering of a context-free template
+@lru_cache(maxsize=None)
+def _render_static_cached(template_name, script_root):
+    """Renders a context-free template for a given script root, caching the result.
+
+    Args:
+        template_name (str): The name of the template to render.
+        script_root (str): The script root the URLs in the template are built against.
+
+    Returns:
+        str: The rendered HTML.
+    """
+    return render_template(template_name)
 
 
 # Route for the home page
@@ -157,12 +384,12 @@ def get_high_scores_route():
 def index():
     """Renders the home page.
 
-    This route renders the 'index.html' template.
+    This route serves the cached rendering of the 'index.html' template.
 
     Returns:
         Response: The rendered HTML of the home page.
     """
-    return render_template('index.html')
+    return render_static('index.html')
 
 
 # Route for the snake game page
@@ -170,12 +397,12 @@ def index():
 def snake():
     """Renders the snake game page.
 
-    This route renders the 'snake.html' template.
+    This route serves the cached rendering of the 'snake.html' template.
 
     Returns:
         Response: The rendered HTML of the snake game page.
     """
-    return render_template('snake.html')
+    return render_static('snake.html')
 
 
 # Route for the Hi-Lo game page
@@ -183,35 +410,23 @@ def snake():
 def hilo():
     """Renders the Hi-Lo game page and initializes game settings.
 
-    This route initializes the game points and errors in the session if not already set.
+    This route loads the game points and errors from the database, starting a new game if needed.
     It generates two random numbers and renders the 'hilo.html' template with game data.
 
     Returns:
         Response: The rendered HTML of the Hi-Lo game page.
     """
-    if 'hilo_points' not in session:
-        session['hilo_points'] = 100  # Initialize points to 100 if not set
-
-    points = session['hilo_points']  # Retrieve points from session
+    game_id = get_game_id()  # Get the player's game id
+    points, errors = get_hilo_state(game_id)  # Retrieve points and errors from the database
 
-    if 'hilo_errors' not in session:
-        session['hilo_errors'] = 3  # Initialize errors to 3 if not set
-
-    errors = session['hilo_errors']
     if errors == 0:
-        final_points = session['hilo_points']
-        session['hilo_points'] = 100  # Reset game points
-        session['hilo_errors'] = 3  # Reset errors
+        delete_hilo_state(game_id)  # End the game; the next visit starts a new one
         top_scores = get_high_scores()  # Get high scores
         return render_template('hilo_gameover.html',
-                               points=final_points,
+                               points=points,
                                top_scores=top_scores)  # Render game over template
 
-    while True:
-        number_first = randint(1, 10)  # Generate the first random number
-        number_second = randint(1, 10)  # Generate the second random number
-        if number_first != number_second:
-            break
+    number_first, number_second = sample(range(1, 11), 2)  # Draw two distinct random numbers
 
     return render_template('hilo.html',
                            points=points,
@@ -225,27 +440,31 @@ def hilo():
 def hilo_guess():
     """Handles the POST request for Hi-Lo game guesses.
 
-    This route processes the player's guess, updates the points and errors in the session,
-    and renders the result template with the game data.
+    This route processes the player's guess, updates the points and errors in the database,
+    and renders the result template with the game data. The session cookie is not modified.
 
     Returns:
         Response: The rendered HTML of the result page.
     """
-    number_first = int(request.form.get('number_first'))  # Get the first number from the form
-    number_second = int(request.form.get('number_second'))  # Get the second number from the form
-    guess = request.form.get('guess')  # Get the player's guess from the form
-    points = int(request.form.get('points'))  # Get the points from the form
+    form = request.form  # Look up the parsed form once
+    try:
+        number_first = int(form['number_first'])  # Get the first number from the form
+        number_second = int(form['number_second'])  # Get the second number from the form
+        guess = form['guess']  # Get the player's guess from the form
+    except (KeyError, ValueError):
+        abort(400)  # Reject missing or non-numeric fields
+
+    game_id = get_game_id()  # Get the player's game id
 
     if guess == 'Higher' and number_second > number_first:
         result = 'correct'
-        session['hilo_points'] += 50  # Increase points if guess is correct
+        update_hilo_state(game_id, 50, 0)  # Increase points if guess is correct
     elif guess == 'Lower' and number_second < number_first:
         result = 'correct'
-        session['hilo_points'] += 50  # Increase points if guess is correct
+        update_hilo_state(game_id, 50, 0)  # Increase points if guess is correct
     else:
         result = 'incorrect'
-        session['hilo_points'] -= 50  # Decrease points if guess is incorrect
-        session['hilo_errors'] -= 1  # Decrease errors if guess is incorrect
+        update_hilo_state(game_id, -50, -1)  # Decrease points and errors if guess is incorrect
 
     return render_template('hilo_result.html',
                            number_first=number_first,
@@ -5,3 +5,17 @@ CREATE TABLE IF NOT EXISTS high_scores (
     game TEXT,
     score INTEGER
 );
+
+-- Covering index so top-N queries read scores in order without a sort step
+CREATE INDEX IF NOT EXISTS idx_high_scores_score ON high_scores (score DESC, name);
+
+-- Per-player Hi-Lo game state, keyed by the id stored in the session cookie
+CREATE TABLE IF NOT EXISTS game_state (
+    session_id TEXT PRIMARY KEY,
+    hilo_points INTEGER NOT NULL DEFAULT 100,
+    hilo_errors INTEGER NOT NULL DEFAULT 3,
+    updated_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+);
+
+-- Lets stale games be pruned without a full table scan
+CREATE INDEX IF NOT EXISTS idx_game_state_updated_at ON game_state (updated_at);